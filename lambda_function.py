@@ -2,12 +2,19 @@
 
 import boto3
 import datetime
-import csv
-import time
 import io
+import itertools
+import json
 from datetime import timezone, timedelta
 import logging
 import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
 
 required_env_vars = ['S3_BUCKET', 'S3_KEY', 'REGION', 'SENDER_EMAIL', 'RECIPIENT_EMAIL']
 
@@ -26,23 +33,65 @@ REGION = os.environ.get('REGION')
 HOUR_THRESHOLD = 0   # Report instances running longer than this many hours
 LOOKBACK_DAYS = 7     # How many days to check history
 INSTANCE_REGION = ""
+MAX_WORKERS = 16      # Number of concurrent AWS API calls
+METRIC_PERIOD = 86400  # CloudWatch datapoint period in seconds (1 day)
+METRIC_SAMPLES_PER_HOUR = 60  # CloudWatch records one CPUUtilization sample per minute while running
+METRIC_QUERY_LIMIT = 500  # Maximum metric queries per GetMetricData request
+SEARCH_SERIES_LIMIT = 500  # Maximum time series a CloudWatch SEARCH expression returns
+CACHE_PREFIX = "cache/"   # S3 key prefix for cached daily runtimes
+CACHE_SETTLE_TIME = timedelta(hours=1)  # Wait this long after midnight before caching a day
+REPORT_PART_SIZE = 5 * 1024 * 1024  # Multipart upload part size for the report (S3 minimum)
+REPORT_COMPRESS_LEVEL = 1  # gzip level for the report, CSV compresses well even at the fastest level
 
 # SES Configuration
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL')  # Replace with a verified email in SES
 RECIPIENT_EMAIL = os.environ.get('RECIPIENT_EMAIL')  # Replace with recipient email
 
+# Shared client configuration, throttling is handled by botocore's retry mode
+# A larger pool and TCP keepalive let worker threads reuse open connections
+_cfg = boto3.session.Config(
+    retries={'max_attempts': 10, 'mode': 'standard'},
+    max_pool_connections=50,
+    tcp_keepalive=True
+)
+
 # Initialize SES client
-ses_client = boto3.client("ses", region_name=REGION, config=boto3.session.Config(
-    signature_version='v4',
-    retries={'max_attempts': 10, 'mode': 'standard'}
-))
+ses_client = boto3.client("sesv2", region_name=REGION, config=_cfg.merge(boto3.session.Config(
+    signature_version='v4'
+)))
+
+# Clients are thread-safe once created, but creating them is not
+_session = boto3.session.Session()
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Initialize S3 client
+s3_client = boto3.client("s3", region_name=REGION, config=_cfg)
+
+def get_client(service, region):
+    """
+    Return a cached boto3 client for a service and region.
+
+    Args:
+        service (str): The AWS service name, e.g. 'cloudwatch'.
+        region (str): The AWS region to connect to.
 
-def send_email(report_link):
+    Returns:
+        botocore.client.BaseClient: A client created on first use and reused afterwards.
+    """
+    key = (service, region)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = _session.client(service, region_name=region, config=_cfg)
+        return _clients[key]
+
+def send_email(report_link, attachment=None):
     """
     Send an email via AWS SES with the report link.
 
     Args:
         report_link (str): The S3 URL of the generated report.
+        attachment (bytes): The gzip-compressed report to attach, or None to only send the link.
 
     Returns:
         None
@@ -55,23 +104,50 @@ def send_email(report_link):
         logger.error("Missing email configuration. Please set SENDER_EMAIL and RECIPIENT_EMAIL environment variables.")
         return
     
+    msg = MIMEMultipart()
+    msg["Subject"] = subject
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = RECIPIENT_EMAIL
+    msg.attach(MIMEText(body_text))
+
+    if attachment is not None:
+        part = MIMEApplication(attachment, "gzip")
+        part.add_header("Content-Disposition", "attachment", filename=os.path.basename(report_link))
+        msg.attach(part)
+
     try:
         response = ses_client.send_email(
-            Source=SENDER_EMAIL,
+            FromEmailAddress=SENDER_EMAIL,
             Destination={"ToAddresses": [RECIPIENT_EMAIL]},
-            Message={
-                "Subject": {"Data": subject},
-                "Body": {"Text": {"Data": body_text}}
-            },
+            Content={"Raw": {"Data": msg.as_bytes()}},
         )
         logger.info(f"Email sent successfully! Message ID: {response['MessageId']}")
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
 
 
-def get_all_instances():
+def parse_stop_time(reason):
+    """
+    Parse the stop time from an EC2 state transition reason.
+
+    Args:
+        reason (str): The reason, e.g. "User initiated (2024-01-01 12:00:00 GMT)".
+
+    Returns:
+        datetime: The stop time in UTC, or None if the reason has no timestamp.
+    """
+    match = re.search(r'\((\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) GMT\)', reason)
+    if not match:
+        return None
+    return datetime.datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+def fetch_region(region, current_time):
     """
-    Retrieve all EC2 instances using pagination.
+    Retrieve all EC2 instances in a single region using pagination.
+
+    Args:
+        region (str): The AWS region to check.
+        current_time (datetime): The time to measure running sessions against.
 
     Returns:
         list: A list of dictionaries containing instance details, including:
@@ -81,149 +157,441 @@ def get_all_instances():
             - State (str): The current state of the instance.
             - CurrentSession (float): Running time in hours if the instance is active, otherwise 0.
             - Region (str): The AWS region of the instance.
+            - LaunchTime (datetime): When the instance was last started.
+            - StoppedAt (datetime): When a stopped instance was stopped, otherwise None.
+    """
+    logger.info(f"Getting instances from region: {region}")
+    region_instances = []
+
+    # Connect to EC2
+    ec2 = get_client('ec2', region)
+
+    # Get all instances
+    paginator = ec2.get_paginator('describe_instances')
+
+    # Terminated instances only linger for about an hour, skip them server-side
+    pages = paginator.paginate(
+        Filters=[{'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']}],
+        PaginationConfig={'PageSize': 1000}
+    )
+
+    # Loop through the response and extract instance details
+    for page in pages:
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                # Get instance name from tags
+                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', ())}
+                instance_name = tags.get('Name', "Unnamed")
+
+                # Create dictionary with instance info
+                instance_info = {
+                    'InstanceId': instance['InstanceId'],
+                    'Name': instance_name,
+                    'Type': instance['InstanceType'],
+                    'State': instance['State']['Name'],
+                    'CurrentSession': 0,
+                    'Region': region,
+                    'LaunchTime': instance['LaunchTime'],
+                    'StoppedAt': None
+                }
+
+                # If instance is running, calculate current session time
+                if instance['State']['Name'] == 'running':
+                    launch_time = instance['LaunchTime']
+                    running_time = current_time - launch_time
+                    instance_info['CurrentSession'] = running_time.total_seconds() / 3600  # Convert to hours
+
+                # The stop time is only reported inside the state transition reason
+                if instance['State']['Name'] == 'stopped':
+                    instance_info['StoppedAt'] = parse_stop_time(instance.get('StateTransitionReason', ''))
+
+                # Add to our list
+                region_instances.append(instance_info)
+
+    return region_instances
+
+def describe_regions():
+    """
+    Look up the regions to check for EC2 instances.
+
+    Returns:
+        list: INSTANCE_REGION if set, otherwise every region enabled for the account.
+    """
+    # If region is specified, only check that region
+    if INSTANCE_REGION:
+        return [INSTANCE_REGION]
+
+    # Get all regions enabled for this account
+    ec2_global = get_client('ec2', REGION)
+    response = ec2_global.describe_regions(
+        AllRegions=False,
+        Filters=[{'Name': 'opt-in-status', 'Values': ['opt-in-not-required', 'opted-in']}]
+    )
+    regions = [region['RegionName'] for region in response['Regions']]
+    logger.info(f"Checking instances across {len(regions)} regions")
+    return regions
+
+# Look up regions and build their clients during the Lambda init phase so invocations skip it
+try:
+    REGIONS = describe_regions()
+    for region in REGIONS:
+        get_client('ec2', region)
+        get_client('cloudwatch', region)
+except Exception as e:
+    logger.error(f"Error getting regions during init: {str(e)}")
+    REGIONS = None
+
+def get_regions():
+    """
+    Return the regions looked up during init, retrying the lookup if it failed.
+
+    Returns:
+        list: INSTANCE_REGION if set, otherwise every region enabled for the account.
+    """
+    global REGIONS
+    if REGIONS is None:
+        REGIONS = describe_regions()
+    return REGIONS
+
+def load_cache(region):
+    """
+    Load the cached daily runtimes for a region from S3.
+
+    Args:
+        region (str): The AWS region of the cached instances.
+
+    Returns:
+        dict: Runtime hours keyed by instance ID, then by ISO date.
     """
-    logger.info("Getting all EC2 instances...")
-    
     try:
-        all_instances = []
-
-        # If region is specified, only check that region
-        if INSTANCE_REGION:
-            regions = [INSTANCE_REGION]
-        else:
-            # Get all regions
-            ec2_global = boto3.client('ec2')
-            regions = [region['RegionName'] for region in ec2_global.describe_regions()['Regions']]
-            logger.info(f"Checking instances across {len(regions)} regions")
-
-                # Loop through each region
-        for region in regions:
-            logger.info(f"Getting instances from region: {region}")    
-            # Connect to EC2
-            ec2 = boto3.client('ec2', region_name=region)
-        
-            # Get all instances
-            paginator = ec2.get_paginator('describe_instances')
-        
-        
-            # Loop through the response and extract instance details
-            for page in paginator.paginate():
-                for reservation in page['Reservations']:
-                    for instance in reservation['Instances']:
-                    # Get instance name from tags
-                        instance_name = "Unnamed"
-                        if 'Tags' in instance:
-                            for tag in instance['Tags']:
-                                if tag['Key'] == 'Name':
-                                    instance_name = tag['Value']
-                    
-                        # Create dictionary with instance info
-                        instance_info = {
-                            'InstanceId': instance['InstanceId'],
-                            'Name': instance_name,
-                            'Type': instance['InstanceType'],
-                            'State': instance['State']['Name'],
-                            'CurrentSession': 0,
-                            'Region': region
-                        }
-                    
-                        # If instance is running, calculate current session time
-                        if instance['State']['Name'] == 'running':
-                            launch_time = instance['LaunchTime']
-                            current_time = datetime.datetime.now(timezone.utc)
-                            running_time = current_time - launch_time
-                            instance_info['CurrentSession'] = running_time.total_seconds() / 3600  # Convert to hours
-                    
-                        # Add to our list
-                        all_instances.append(instance_info)
-        
-        logger.info(f"Found {len(all_instances)} instances across all regions..")
-        return all_instances
-    
+        response = s3_client.get_object(Bucket=S3_BUCKET, Key=f"{CACHE_PREFIX}{region}-hours.json")
+        return json.loads(response['Body'].read())
+    except s3_client.exceptions.NoSuchKey:
+        return {}
     except Exception as e:
-            logger.error(f"Error getting instances: {str(e)}")
-            return []
+        logger.info(f"Error loading runtime cache for {region}: {str(e)}")
+        return {}
 
-def get_cumulative_runtime(instance_id, region):
+def save_cache(region, cache):
     """
-    Calculate cumulative runtime for an instance over a defined period.
+    Save the daily runtimes for a region to S3.
 
     Args:
-        instance_id (str): The ID of the EC2 instance.
+        region (str): The AWS region of the cached instances.
+        cache (dict): Runtime hours keyed by instance ID, then by ISO date.
 
     Returns:
-        float: Cumulative runtime in hours over the past LOOKBACK_DAYS.
+        None
     """
+    try:
+        s3_client.put_object(Bucket=S3_BUCKET, Key=f"{CACHE_PREFIX}{region}-hours.json", Body=json.dumps(cache))
+    except Exception as e:
+        logger.info(f"Error saving runtime cache for {region}: {str(e)}")
+
+def get_daily_runtimes(cloudwatch, instance_ids, start_time, end_time):
+    """
+    Calculate runtime per day for a batch of instances.
+
+    Args:
+        cloudwatch: A CloudWatch client for the instances' region.
+        instance_ids (list): Up to METRIC_QUERY_LIMIT EC2 instance IDs.
+        start_time (datetime): Start of the period to query, at midnight UTC.
+        end_time (datetime): End of the period to query.
+
+    Returns:
+        dict: Runtime hours keyed by instance ID, then by ISO date.
+    """
+    runtimes = {instance_id: {} for instance_id in instance_ids}
+
+    # Get the number of CPU Utilization samples per day
+    # This is an effective way to check if an instance was running
+    # because CloudWatch only collects metrics when the instance is active
+    queries = [
+        {
+            'Id': f'm{i}',
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': 'AWS/EC2',
+                    'MetricName': 'CPUUtilization',
+                    'Dimensions': [
+                        {
+                            'Name': 'InstanceId',
+                            'Value': instance_id
+                        },
+                    ]
+                },
+                'Period': METRIC_PERIOD,
+                'Stat': 'SampleCount'
+            }
+        }
+        for i, instance_id in enumerate(instance_ids)
+    ]
+
+    paginator = cloudwatch.get_paginator('get_metric_data')
+    for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time):
+        for result in page['MetricDataResults']:
+            day_runtimes = runtimes[instance_ids[int(result['Id'][1:])]]
+            for timestamp, samples in zip(result['Timestamps'], result['Values']):
+                day = timestamp.date().isoformat()
+                day_runtimes[day] = day_runtimes.get(day, 0) + samples / METRIC_SAMPLES_PER_HOUR
+
+    return runtimes
+
+def search_daily_runtimes(cloudwatch, instance_ids, start_time, end_time):
+    """
+    Calculate runtime per day for every instance in a region with one SEARCH expression.
+
+    Args:
+        cloudwatch: A CloudWatch client for the instances' region.
+        instance_ids (list): EC2 instance IDs in the region.
+        start_time (datetime): Start of the period to query, at midnight UTC.
+        end_time (datetime): End of the period to query.
+
+    Returns:
+        dict: Runtime hours keyed by instance ID, then by ISO date, or None if
+            the search hit SEARCH_SERIES_LIMIT and may be missing instances.
+    """
+    runtimes = {instance_id: {} for instance_id in instance_ids}
+
+    # Label each returned series with its instance ID so it can be joined back
+    queries = [
+        {
+            'Id': 'e1',
+            'Expression': f"SEARCH('{{AWS/EC2,InstanceId}} MetricName=\"CPUUtilization\"', 'SampleCount', {METRIC_PERIOD})",
+            'Label': "${PROP('Dim.InstanceId')}",
+            'ReturnData': True
+        }
+    ]
+
+    series = set()
+    paginator = cloudwatch.get_paginator('get_metric_data')
+    for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time):
+        for result in page['MetricDataResults']:
+            series.add(result['Label'])
+            day_runtimes = runtimes.get(result['Label'])
+            if day_runtimes is None:
+                continue
+            for timestamp, samples in zip(result['Timestamps'], result['Values']):
+                day = timestamp.date().isoformat()
+                day_runtimes[day] = day_runtimes.get(day, 0) + samples / METRIC_SAMPLES_PER_HOUR
+
+    if len(series) >= SEARCH_SERIES_LIMIT:
+        return None
+
+    return runtimes
+
+def get_region_runtimes(region, instance_ids, end_time):
+    """
+    Calculate cumulative runtime for all instances in one region.
+
+    The lookback window covers the previous LOOKBACK_DAYS days plus today.
+    Completed days are cached in S3, so only days missing from the cache
+    and today are queried from CloudWatch.
+
+    Args:
+        region (str): The AWS region of the instances.
+        instance_ids (list): EC2 instance IDs in the region.
+        end_time (datetime): End of the lookback window.
+
+    Returns:
+        dict: Cumulative runtime in hours keyed by instance ID.
+    """
+    runtimes = {instance_id: 0 for instance_id in instance_ids}
+
     try:
         # Connect to CloudWatch
-        cloudwatch = boto3.client('cloudwatch', region_name=region)
-        
+        cloudwatch = get_client('cloudwatch', region)
+
         # Calculate time period
-        end_time = datetime.datetime.now(timezone.utc)
-        start_time = end_time - timedelta(days=LOOKBACK_DAYS)
-        print(start_time)
-        
-        # Get CPU Utilization data points
-        # This is an effective way to check if an instance was running
-        # because CloudWatch only collects metrics when the instance is active
-        response = cloudwatch.get_metric_statistics(
-            Namespace='AWS/EC2',
-            MetricName='CPUUtilization',
-            Dimensions=[
-                {
-                    'Name': 'InstanceId',
-                    'Value': instance_id
-                },
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=1800,  # 30 minutes intervals
-            Statistics=['Average']
+        today = end_time.date()
+        days = [(today - timedelta(days=n)).isoformat() for n in range(LOOKBACK_DAYS, -1, -1)]
+        # Late datapoints can still arrive shortly after midnight
+        settled = (end_time - CACHE_SETTLE_TIME).date().isoformat()
+
+        cache = load_cache(region)
+        cached = {instance_id: cache.get(instance_id, {}) for instance_id in instance_ids}
+
+        # Only query from the first day that is missing for any instance
+        start_day = next(
+            (day for day in days[:-1] if any(day not in cached[instance_id] for instance_id in instance_ids)),
+            days[-1]
         )
+        start_time = datetime.datetime.fromisoformat(start_day).replace(tzinfo=timezone.utc)
+        logger.info(f"Querying CloudWatch in {region} from {start_day}")
+
+        # One search covers the whole region, unless it may have been truncated
+        queried = None
+        if len(instance_ids) < SEARCH_SERIES_LIMIT:
+            queried = search_daily_runtimes(cloudwatch, instance_ids, start_time, end_time)
+
+        if queried is None:
+            queried = {}
+            for i in range(0, len(instance_ids), METRIC_QUERY_LIMIT):
+                chunk = instance_ids[i:i + METRIC_QUERY_LIMIT]
+                queried.update(get_daily_runtimes(cloudwatch, chunk, start_time, end_time))
+
+        new_cache = {}
+        for instance_id in instance_ids:
+            day_runtimes = {
+                day: queried[instance_id].get(day, 0) if day >= start_day else cached[instance_id][day]
+                for day in days
+            }
+            new_cache[instance_id] = {day: hours for day, hours in day_runtimes.items() if day < settled}
+            runtimes[instance_id] = round(sum(day_runtimes.values()), 2)
+
+        save_cache(region, new_cache)
 
-        period_seconds = 1800  # Ensure this matches the "Period" value in the request
-        
-        # Count data points (each represents an hour the instance was running)
-        data_points_count = len(response['Datapoints'])
-        runtime_hours = (data_points_count * period_seconds) / 3600  
-        
-        return runtime_hours
-    
     except Exception as e:
-        logger.info(f"Error calculating runtime for {instance_id} in {region}: {str(e)}")
-        return 0
+        logger.info(f"Error calculating runtimes for {len(instance_ids)} instances in {region}: {str(e)}")
+
+    return runtimes
 
 def calculate_all_runtimes():
     """
     Calculate cumulative runtime for all instances
 
+    Each region's CloudWatch queries are submitted as soon as its instances
+    are known, so discovery and metric retrieval overlap across regions.
+
     Returns:
         list: A list of dictionaries with instance details and their cumulative runtime.
     """
     logger.info(f"Calculating cumulative runtime over the past {LOOKBACK_DAYS} days...")
     
-    # Get all instances
-    instances = get_all_instances()
+    # One timestamp for the whole run keeps CurrentSession comparable across regions
+    end_time = datetime.datetime.now(timezone.utc)
+    window_start = datetime.datetime.combine(end_time.date() - timedelta(days=LOOKBACK_DAYS), datetime.time(), tzinfo=timezone.utc)
+    logger.info(f"Lookback window: {window_start} to {end_time}")
+    
+    instances = []
+    runtime_futures = []
     
-    # Track progress
-    total = len(instances)
-    processed = 0
+    # Throttling is handled by botocore's retry mode
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        try:
+            logger.info("Getting all EC2 instances...")
+            region_futures = {executor.submit(fetch_region, region, end_time): region for region in get_regions()}
+    
+            for region_future in as_completed(region_futures):
+                region = region_futures[region_future]
+                region_instances = region_future.result()
+                instances.extend(region_instances)
+    
+                # Instances stopped before the window started cannot have any runtime in it
+                instance_ids = [
+                    instance['InstanceId'] for instance in region_instances
+                    if not (instance['StoppedAt'] and instance['StoppedAt'] < window_start)
+                ]
+    
+                # Query CloudWatch for this region while other regions are still being listed
+                if instance_ids:
+                    logger.info(f"Processing {len(instance_ids)} instances in {region}")
+                    runtime_futures.append(executor.submit(get_region_runtimes, region, instance_ids, end_time))
+    
+            logger.info(f"Found {len(instances)} instances across all regions..")
+    
+        except Exception as e:
+            logger.error(f"Error getting instances: {str(e)}")
+            for future in runtime_futures:
+                future.cancel()
+            return []
+    
+        runtimes = {}
+        for future in runtime_futures:
+            runtimes.update(future.result())
     
-    # Process each instance
     for instance in instances:
-        # Track progress
-        processed += 1
-        logger.info(f"Processing instance {processed}/{total}: {instance['InstanceId']} ({instance['Name']}) in {instance['Region']}")
-        
-        # Calculate cumulative runtime
-        cumulative_hours = get_cumulative_runtime(instance['InstanceId'], instance['Region'])
-        instance['CumulativeHours'] = cumulative_hours
-        
-        # Sleep briefly to avoid hitting API rate limits
-        time.sleep(0.2)
+        instance['CumulativeHours'] = runtimes.get(instance['InstanceId'], 0)
     
     return instances
 
+def csv_quote(value):
+    """
+    Quote a CSV field the same way csv.writer does with QUOTE_MINIMAL.
+
+    Args:
+        value (str): The field value.
+
+    Returns:
+        str: The value, quoted if it contains a delimiter, quote or newline.
+    """
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def iter_report_parts(instances):
+    """
+    Generate a gzip-compressed CSV report in parts suitable for a multipart upload.
+
+    Compressed rows are buffered until REPORT_PART_SIZE bytes have been written
+    and then yielded as one part, so the whole report is never held in memory.
+
+    Args:
+        instances (list): The instances to write, one row each.
+
+    Yields:
+        bytes: The compressed CSV, every part except the last at least REPORT_PART_SIZE.
+    """
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(REPORT_COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    csv_buffer = io.BytesIO()
+    csv_buffer.write(compressor.compress(b"InstanceId,Name,Type,State,Region,CurrentSession,CumulativeHours\r\n"))
+
+    for i in instances:
+        # Only the name is user-controlled, the other fields never need quoting
+        row = f"{i['InstanceId']},{csv_quote(i['Name'])},{i['Type']},{i['State']},{i['Region']},{round(i['CurrentSession'], 2)},{i['CumulativeHours']}\r\n"
+        csv_buffer.write(compressor.compress(row.encode()))
+
+        # Every part except the last must be at least 5 MB
+        if csv_buffer.tell() >= REPORT_PART_SIZE:
+            yield csv_buffer.getvalue()
+            csv_buffer.seek(0)
+            csv_buffer.truncate()
+
+    csv_buffer.write(compressor.flush())
+    yield csv_buffer.getvalue()
+
+def upload_report(report_parts, s3_key):
+    """
+    Stream a CSV report to S3 using a multipart upload.
+
+    Args:
+        report_parts (iterable): The encoded report, as produced by iter_report_parts.
+        s3_key (str): The S3 key to upload the report to.
+
+    Returns:
+        None
+    """
+    upload = s3_client.create_multipart_upload(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        ContentType='text/csv',
+        ContentEncoding='gzip'
+    )
+    parts = []
+
+    try:
+        for body in report_parts:
+            response = s3_client.upload_part(
+                Bucket=S3_BUCKET,
+                Key=s3_key,
+                UploadId=upload['UploadId'],
+                PartNumber=len(parts) + 1,
+                Body=body
+            )
+            parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+
+        s3_client.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=s3_key,
+            UploadId=upload['UploadId'],
+            MultipartUpload={'Parts': parts}
+        )
+
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, UploadId=upload['UploadId'])
+        raise
+
 def generate_report(instances):
     """
     Generate a CSV report of EC2 instance runtimes, upload it to S3, and send an email.
@@ -238,32 +606,22 @@ def generate_report(instances):
     long_running.sort(key=lambda x: x['CumulativeHours'], reverse=True)
 
     try:
-        csv_buffer = io.StringIO()
-        fieldnames = ['InstanceId', 'Name', 'Type', 'State', 'Region', 'CurrentSession', 'CumulativeHours']
-        writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for instance in long_running:
-            writer.writerow({
-                'InstanceId': instance['InstanceId'],
-                'Name': instance['Name'],
-                'Type': instance['Type'],
-                'State': instance['State'],
-                'Region': instance['Region'],
-                'CurrentSession': round(instance['CurrentSession'], 2),
-                'CumulativeHours': instance['CumulativeHours']
-            })
-
-        s3 = boto3.resource('s3')
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        s3_key = S3_KEY.replace('.csv', f'_{timestamp}.csv')
-        s3.Object(S3_BUCKET, s3_key).put(Body=csv_buffer.getvalue())
-
+        s3_key = S3_KEY.replace('.csv', f'_{timestamp}.csv') + '.gz'
         report_link = f"https://{S3_BUCKET}.s3.{REGION}.amazonaws.com/{s3_key}"
-        logger.info(f"Report uploaded to S3: {report_link}")
 
-        # Send email notification
-        send_email(report_link)
+        # A report that fits in a single part is small enough to attach to the email
+        report_parts = iter_report_parts(long_running)
+        first_part = next(report_parts)
+        attachment = first_part if len(first_part) < REPORT_PART_SIZE else None
+
+        # The link is known before the upload finishes, so send the email notification alongside it
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            upload_future = executor.submit(upload_report, itertools.chain([first_part], report_parts), s3_key)
+            email_future = executor.submit(send_email, report_link, attachment)
+            upload_future.result()
+            logger.info(f"Report uploaded to S3: {report_link}")
+            email_future.result()
 
         return {"status": "Success", "message": f"Report saved to {s3_key}, email sent."}
 